@@ -1,19 +1,46 @@
+import array
 import machine
+import micropython
 import time
 import math
-import json
+
+from micropython import const
 
 
 # Heavily adjusted by Oscar Koeroo
 
+# const() lets the compiler fold these into the bytecode instead of a
+# class-attribute lookup at every use.
+_ADDR = const(0x52)
+
+_TOL_X = const(15)
+_TOL_Y = const(5)
+
+_Z_BUTTON = const(0b00000001)
+_C_BUTTON = const(0b00000010)
+
+
 class Nunchuck(object):
-    address = 0x52
+    address = _ADDR
+
+    tolerance_joy_x = _TOL_X
+    tolerance_joy_y = _TOL_Y
+
+    Z_BUTTON = _Z_BUTTON
+    C_BUTTON = _C_BUTTON
 
-    tolerance_joy_x = 15
-    tolerance_joy_y = 5
+    # Pre-allocated command payloads, so writeto() does not build a new
+    # bytes object on every call.
+    _CMD_INIT = b'\x40\x00'
+    _CMD_POLL = b'\x00\x00'
 
-    Z_BUTTON = 0b00000001
-    C_BUTTON = 0b00000010
+    # Lookup table for the C/Z fix mode, indexed by the raw low two bits
+    # of buffer[5]. Bit 1 of the entry is button C, bit 0 is button Z:
+    #   raw 0b00 -> (C=False, Z=True)  -> 0b01
+    #   raw 0b01 -> (C=True,  Z=False) -> 0b10
+    #   raw 0b10 -> (C=True,  Z=True)  -> 0b11
+    #   raw 0b11 -> (C=False, Z=False) -> 0b00
+    _CZ_TABLE = b'\x01\x02\x03\x00'
 
     """The Nunchuk object presents the sensor readings in a polling way.
     Based on the fact that the controller does communicate using I2C we
@@ -26,11 +53,24 @@ class Nunchuck(object):
     corresponding update() method does not allocate memory and thereby
     could directly be used as an callback method for a timer interrupt."""
 
-    def __init__(self, scl_pin, sda_pin, freq=100_000, nunchuck_c_z_fix_mode=False):
+    def __init__(self, scl_pin, sda_pin, freq=100_000, nunchuck_c_z_fix_mode=False,
+                 poll_delay_us=300, max_age_ms=0):
 
         ### Fixing some weird effect where the last two bits are intertwined
         self.nunchuck_c_z_fix_mode = nunchuck_c_z_fix_mode
 
+        # Dwell between the poll command and the read-back. The
+        # controller needs far less than the 5 ms it was historically
+        # given; 300 us is ample and lifts the poll rate towards 1 kHz.
+        self._poll_delay_us = poll_delay_us
+
+        # With max_age_ms > 0 the accessors refresh the readings
+        # themselves once they are older than max_age_ms, so a burst of
+        # accessor calls within one frame costs a single I2C transaction.
+        # The default of 0 keeps the manual update() discipline.
+        self._max_age_ms = max_age_ms
+        self._last_update_ms = 0
+
         """Initialize the Nunchuk controller. If no polling is desired it
         can be disabled. Only one controller is possible on one I2C bus,
         because the address of the controller is fixed.
@@ -41,47 +81,95 @@ class Nunchuck(object):
                                      sda=machine.Pin(sda_pin),
                                      freq=freq)
         self.buffer = bytearray(6)
+        # Stable view over the buffer: subscripting a memoryview skips
+        # the bytearray bounds/length path, and readfrom_into accepts it
+        # just the same.
+        self._mv = memoryview(self.buffer)
+        # Scratch array filled by _decode_all(): joy x/y, accel x/y/z
+        # and the raw button bits, decoded in one pass.
+        self._fields = array.array('H', (0, 0, 0, 0, 0, 0))
         self._joy_x_center = 0
         self._joy_y_center = 0
+        # Q16 fixed-point reciprocals of the centers (times 100), so the
+        # percentage math is a multiply and shift instead of a software
+        # divide (no divider on the Cortex-M0+). Set by calibration.
+        self._inv_joy_x_100_q16 = 0
+        self._inv_joy_y_100_q16 = 0
         self.init_nunchuck()
-        time.sleep_ms(5)
+        # The init handshake settles well within a millisecond; a 500 us
+        # ticks-based deadline replaces the old fixed 5 ms sleep.
+        t0 = time.ticks_us()
+        while time.ticks_diff(time.ticks_us(), t0) < 500:
+            pass
         self.calibrate()
 
     def init_nunchuck(self):
-        self.i2c.writeto(self.address, b'\x40\x00')
+        self.i2c.writeto(_ADDR, self._CMD_INIT)
 
     def submit_data_request(self):
-        self.i2c.writeto(self.address, b'\x00\x00')
-        time.sleep_ms(5)
+        self.i2c.writeto(_ADDR, self._CMD_POLL)
+        time.sleep_us(self._poll_delay_us)
 
     def fetch_data(self):
-        self.buffer = bytearray(6)
-        self.i2c.readfrom_into(self.address, self.buffer)
+        # Reuse the buffer allocated in __init__, otherwise update() would
+        # allocate and could not serve as a timer interrupt callback.
+        self.i2c.readfrom_into(_ADDR, self._mv)
 
     def update(self):
         """Requests a sensor readout from the controller and receives the
         six data bits afterwards."""
-        self.submit_data_request()
-        self.fetch_data()
+        # One combined transaction: the poll command is written without a
+        # STOP so the read follows on a repeated start, halving the
+        # driver-call overhead of the separate submit_data_request() +
+        # fetch_data() pair. Those two remain available for controllers
+        # that misbehave without a STOP between the phases.
+        self.i2c.writeto(_ADDR, self._CMD_POLL, False)
+        time.sleep_us(self._poll_delay_us)
+        self.i2c.readfrom_into(_ADDR, self._mv)
+        self._last_update_ms = time.ticks_ms()
+
+    def _ensure_fresh(self):
+        if self._max_age_ms == 0:
+            return
+        if time.ticks_diff(time.ticks_ms(), self._last_update_ms) >= self._max_age_ms:
+            self.update()
 
     def calibrate(self):
-        self.update()
-        self.calibrate_joy_x_center()
-        self.calibrate_joy_y_center()
-
-    def joy_x(self):
+        # Average 16 quick reads for the joystick center: a single noisy
+        # sample would otherwise become a permanent calibration bias. A
+        # power-of-two count turns the divide into a shift, and the
+        # pre-allocated buffer is reused for every sample.
+        sum_x = 0
+        sum_y = 0
+        for _ in range(16):
+            self.update()
+            sum_x += self._mv[0]
+            sum_y += self._mv[1]
+            time.sleep_ms(2)
+        self._joy_x_center = sum_x >> 4
+        self._joy_y_center = sum_y >> 4
+        self._inv_joy_x_100_q16 = (100 << 16) // max(self._joy_x_center, 1)
+        self._inv_joy_y_100_q16 = (100 << 16) // max(self._joy_y_center, 1)
+
+    @micropython.viper
+    def joy_x(self) -> int:
         # values 0 - 255, with a prox 128 center
-        return int(self.buffer[0])
+        buf = ptr8(self.buffer)
+        return buf[0]
 
-    def joy_y(self):
+    @micropython.viper
+    def joy_y(self) -> int:
         # values 0 - 255, with a prox 128 center
-        return int(self.buffer[1])
+        buf = ptr8(self.buffer)
+        return buf[1]
 
     def calibrate_joy_x_center(self):
         self._joy_x_center = self.joy_x()
+        self._inv_joy_x_100_q16 = (100 << 16) // max(self._joy_x_center, 1)
 
     def calibrate_joy_y_center(self):
         self._joy_y_center = self.joy_y()
+        self._inv_joy_y_100_q16 = (100 << 16) // max(self._joy_y_center, 1)
 
     def joy_x_center(self):
         return self._joy_x_center
@@ -89,17 +177,40 @@ class Nunchuck(object):
     def joy_y_center(self):
         return self._joy_y_center
 
-    def accel_x(self):
+    ### The shift-mask-add accessors are viper-compiled: with the ptr8
+    ### cast the emitter produces raw load/shift/or instructions instead
+    ### of boxed small-int bytecode.
+    @micropython.viper
+    def accel_x(self) -> int:
         # returns value of x-axis accelerometer: ranges from approx 278 - 686, med 475
-        return (self.buffer[2]<<2)+((self.buffer[5]>>2)&3)
+        buf = ptr8(self.buffer)
+        return (buf[2] << 2) | ((buf[5] >> 2) & 3)
 
-    def accel_y(self):
+    @micropython.viper
+    def accel_y(self) -> int:
         # returns value of y-axis accelerometer: ranges from approx 296 - 716, med 506
-        return (self.buffer[3]<<2)+((self.buffer[5]>>4)&3)
+        buf = ptr8(self.buffer)
+        return (buf[3] << 2) | ((buf[5] >> 4) & 3)
 
-    def accel_z(self):
+    @micropython.viper
+    def accel_z(self) -> int:
         # returns value of z-axis accelerometer: ranges from approx 295 - 1015, med 697
-        return (self.buffer[4]<<2)+((self.buffer[5]>>6)&3)
+        buf = ptr8(self.buffer)
+        return (buf[4] << 2) | ((buf[5] >> 6) & 3)
+
+    @micropython.viper
+    def _decode_all(self):
+        # Decode the whole 6-byte report in one pass into _fields:
+        # buffer[5] is loaded once instead of once per accessor.
+        buf = ptr8(self.buffer)
+        out = ptr16(self._fields)
+        b5 = buf[5]
+        out[0] = buf[0]
+        out[1] = buf[1]
+        out[2] = (buf[2] << 2) | ((b5 >> 2) & 3)
+        out[3] = (buf[3] << 2) | ((b5 >> 4) & 3)
+        out[4] = (buf[4] << 2) | ((b5 >> 6) & 3)
+        out[5] = b5 & 3
 
 
     ### The z_c_buttons() func is only used to solve the weird C/Z button bit sorting.
@@ -108,103 +219,128 @@ class Nunchuck(object):
     #z     = 00
     #      = 11
     def z_c_buttons(self):
-        value_c = self.buffer[5] & self.C_BUTTON == self.C_BUTTON
-        value_z = self.buffer[5] & self.Z_BUTTON == self.Z_BUTTON
-
-        # Return is bool for (button C and button Z)
-
-        if value_c and value_z:
-            return False, False
-
-        elif not value_c and value_z:
-            return True, False
-
-        elif not value_c and not value_z:
-            return False, True
-
-        elif value_c and not value_z:
-            return True, True
+        # Return is bool for (button C and button Z). The table replaces
+        # the old 4-way if/elif ladder: one load, no data-dependent
+        # branches, so the timing is input-independent.
+        self._ensure_fresh()
+        value = self._CZ_TABLE[self._mv[5] & 3]
+        return bool(value & 2), bool(value & 1)
 
 
     def z_button(self):
+        self._ensure_fresh()
         if self.nunchuck_c_z_fix_mode:
             c_butt, z_butt = self.z_c_buttons()
             return z_butt
         else:
-            return not (self.buffer[5] & self.Z_BUTTON == self.Z_BUTTON)
+            return not (self._mv[5] & _Z_BUTTON)
 
     def c_button(self):
+        self._ensure_fresh()
         if self.nunchuck_c_z_fix_mode:
             c_butt, z_butt = self.z_c_buttons()
             return c_butt
         else:
-            return not (self.buffer[5] & self.C_BUTTON == self.C_BUTTON)
+            return not (self._mv[5] & _C_BUTTON)
 
+    def _c_z_from_fields(self):
+        # Button state from the raw bits snapshotted into _fields[5] by
+        # _decode_all(), so the formatters stay on one frame instead of
+        # re-reading the live buffer.
+        bits = self._fields[5]
+        if self.nunchuck_c_z_fix_mode:
+            value = self._CZ_TABLE[bits]
+            return bool(value & 2), bool(value & 1)
+        return not (bits & _C_BUTTON), not (bits & _Z_BUTTON)
 
-    def joy_x_angle_percentages(self):
-        offset = abs(self.joy_x() - self.joy_x_center())
 
-        if offset < self.tolerance_joy_x:
+    def _joy_x_perc(self, x):
+        # Percentage for a given joystick byte, so the formatters can
+        # feed in a snapshotted value. Loads the center once; attribute
+        # lookups are expensive in MicroPython's bytecode interpreter.
+        cx = self._joy_x_center
+        offset = x - cx if x >= cx else cx - x
+
+        if offset < _TOL_X:
             return 0
 
-        if self.joy_x() > self.joy_x_center():
-            return int(offset / self.joy_x_center()* 100)
+        # Multiply by the Q16 reciprocal precomputed at calibration time,
+        # strength-reducing the per-call software divide to MULS + LSRS.
+        if x > cx:
+            return (offset * self._inv_joy_x_100_q16) >> 16
         else:
-            return int(-1 * offset / self.joy_x_center() * 100)
+            return -((offset * self._inv_joy_x_100_q16) >> 16)
 
-    def joy_y_angle_percentages(self):
-        offset = abs(self.joy_y() - self.joy_y_center())
+    def _joy_y_perc(self, y):
+        cy = self._joy_y_center
+        offset = y - cy if y >= cy else cy - y
 
-        if offset < self.tolerance_joy_y:
+        if offset < _TOL_Y:
             return 0
 
-        if self.joy_y() > self.joy_y_center():
-            return int(offset / self.joy_y_center() * 100)
+        if y > cy:
+            return (offset * self._inv_joy_y_100_q16) >> 16
         else:
-            return int(-1 * offset / self.joy_y_center() * 100)
+            return -((offset * self._inv_joy_y_100_q16) >> 16)
+
+    def joy_x_angle_percentages(self):
+        self._ensure_fresh()
+        return self._joy_x_perc(self._mv[0])
+
+    def joy_y_angle_percentages(self):
+        self._ensure_fresh()
+        return self._joy_y_perc(self._mv[1])
 
     def json(self):
-        self.update()
-        d = {}
-        d['c'] = self.c_button()
-        d['z'] = self.z_button()
-        d['joy'] = {}
-        d['joy']['x'] = self.joy_x()
-        d['joy']['y'] = self.joy_y()
-        d['joy']['x_cal_center'] = self.joy_x_center()
-        d['joy']['y_cal_center'] = self.joy_y_center()
-        d['joy']['x_angle_perc'] = self.joy_x_angle_percentages()
-        d['joy']['y_angle_perc'] = self.joy_y_angle_percentages()
-        d['acc'] = {}
-        d['acc']['x'] = self.accel_x()
-        d['acc']['y'] = self.accel_y()
-        d['acc']['z'] = self.accel_z()
-        return json.dumps(d)
+        # Formats the readings already in the buffer; acquiring a frame
+        # is the caller's job via update() (or max_age_ms). The single
+        # refresh happens here, before the snapshot: every field below
+        # reads _fields so one line never mixes two frames.
+        self._ensure_fresh()
+        self._decode_all()
+        fields = self._fields
+        # The schema is fixed and all values are small ints, so an
+        # f-string beats building nested dicts plus json.dumps (one
+        # allocation instead of one per field).
+        c_butt, z_butt = self._c_z_from_fields()
+        return (f'{{"c": {int(c_butt)}, "z": {int(z_butt)}, '
+                f'"joy": {{"x": {fields[0]}, "y": {fields[1]}, '
+                f'"x_cal_center": {self._joy_x_center}, '
+                f'"y_cal_center": {self._joy_y_center}, '
+                f'"x_angle_perc": {self._joy_x_perc(fields[0])}, '
+                f'"y_angle_perc": {self._joy_y_perc(fields[1])}}}, '
+                f'"acc": {{"x": {fields[2]}, "y": {fields[3]}, "z": {fields[4]}}}}}')
 
     def __str__(self):
-        self.update()
-        return " ".join([
-                        f"C:{self.c_button():2}",
-                        f"Z:{self.z_button():2}",
-                        f"Joy:{self.joy_x():4},{self.joy_y():4}",
-                        f"Accel XYZ:{self.accel_x():4},{self.accel_y():4},{self.accel_z():4}",
-                        f"Joy X perc:{self.joy_x_angle_percentages():4}%",
-                        f"Joy Y perc:{self.joy_y_angle_percentages():4}%"])
+        self._ensure_fresh()
+        self._decode_all()
+        fields = self._fields
+        # One f-string instead of six joined ones: a single heap
+        # allocation per frame rather than the list, join and temporaries.
+        c_butt, z_butt = self._c_z_from_fields()
+        return (f"C:{c_butt:2} "
+                f"Z:{z_butt:2} "
+                f"Joy:{fields[0]:4},{fields[1]:4} "
+                f"Accel XYZ:{fields[2]:4},{fields[3]:4},{fields[4]:4} "
+                f"Joy X perc:{self._joy_x_perc(fields[0]):4}% "
+                f"Joy Y perc:{self._joy_y_perc(fields[1]):4}%")
 
     def __repr__(self):
         return f"Nunchuck({self.__str__()})"
 
 
 if __name__ == '__main__':
-    import time
-    from nunchuck import nunchuck
-
-
-    nun = nunchuck.Nunchuck(15, 14, freq=100_000, nunchuck_c_z_fix_mode=True)
+    nun = Nunchuck(15, 14, freq=100_000, nunchuck_c_z_fix_mode=True)
     print("nunchuck initialized and joy stick calibrated")
 
+    # Poll from a hardware timer instead of the print loop: update() is
+    # allocation-free, so it is safe as an interrupt callback, and the
+    # sampling cadence no longer depends on how long printing takes.
+    timer = machine.Timer(-1)
+    timer.init(period=10, mode=machine.Timer.PERIODIC,
+               callback=lambda t: nun.update())
 
     while True:
         print(nun)
         print(nun.json())
-        time.sleep(0.1)
+        time.sleep_ms(100)